@@ -1,57 +1,181 @@
+import hashlib
+import io
+
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-
-st.set_page_config(page_title="Trading Strategy Lab", layout="wide")
-st.title("📚 Trading Strategy Learning Lab")
+import bottleneck as bn
+import altair as alt
+import pyarrow as pa
 
-uploaded_file = st.file_uploader("Upload CSV (Date + Close)", type=["csv"])
+from strategies import NAMES, STRATEGIES, Arrays, Params, backtest, lttb, position_matrix, rsi_wilder
 
-if uploaded_file:
+# a ~1000px chart can't show more than this many points per line
+MAX_POINTS = 2000
 
-    # ================= LOAD =================
-    df = pd.read_csv(uploaded_file)
+st.set_page_config(page_title="Trading Strategy Lab", layout="wide")
+st.title("📚 Trading Strategy Learning Lab")
 
-    df.columns = [c.strip() for c in df.columns]
+# ================= DATA =================
+# every layout is tried with an explicit format so pandas stays on its C
+# parser, and the one that reads the most cells wins (a footer or stray
+# text row can't knock it out); ties go to the earlier entry, so day-first
+# beats month-first since dd-mm-yyyy exports are what this app is usually fed
+DATE_FORMATS = ("ISO8601", "%d-%m-%Y", "%d/%m/%Y", "%m-%d-%Y", "%m/%d/%Y")
+
+def parse_dates(s):
+    best = None
+    for fmt in DATE_FORMATS:
+        d = pd.to_datetime(s, format=fmt, errors="coerce")
+        if best is None or d.count() > best.count():
+            best = d
+    if best.count():
+        return best
+    # none of the known layouts fit: pandas' own per-row inference
+    return pd.to_datetime(s, errors="coerce")
+
+@st.cache_data(show_spinner=False)
+def load_clean(file_bytes: bytes):
+    # parsed once per upload; slider reruns hit the cache
+    header = pd.read_csv(io.BytesIO(file_bytes), nrows=0).columns
 
     # detect columns robustly
     date_col = None
     price_col = None
 
-    for c in df.columns:
+    for c in header:
         if "date" in c.lower():
             date_col = c
         if "close" in c.lower() or "price" in c.lower():
             price_col = c
 
+    # digest of the upload: cache key for everything derived from it
+    key = hashlib.md5(file_bytes).hexdigest()
+
     if date_col is None or price_col is None:
-        st.error("CSV must contain Date and Close/Price column")
-        st.stop()
+        return None, date_col, price_col, key
 
-    df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-    df[price_col] = df[price_col].astype(str).str.replace(",", "")
-    df[price_col] = pd.to_numeric(df[price_col], errors="coerce")
+    # only the two columns we use are tokenized and converted;
+    # "1,234.50" style prices are parsed to floats by the C reader itself
+    df = pd.read_csv(io.BytesIO(file_bytes), usecols=[date_col, price_col], thousands=",")
+
+    df[date_col] = parse_dates(df[date_col])
+    if not pd.api.types.is_numeric_dtype(df[price_col]):
+        # a stray non-numeric cell keeps the whole column as text
+        df[price_col] = df[price_col].str.replace(",", "")
+    df[price_col] = pd.to_numeric(df[price_col], errors="coerce").astype(np.float32)
 
     df = df.dropna().sort_values(date_col).reset_index(drop=True)
+    return df, date_col, price_col, key
+
+# ================= INDICATOR CACHE =================
+# keyed on (upload digest, period) so moving one slider only recomputes
+# the indicator it drives; arrays are shared between reruns, not copied,
+# hence read-only
+@st.cache_resource(max_entries=64, show_spinner=False)
+def sma(_close, period, key):
+    # bottleneck rejects windows longer than the series; pandas gave NaN
+    if period > len(_close):
+        out = np.full_like(_close, np.nan)
+    else:
+        out = bn.move_mean(_close, period)
+    out.flags.writeable = False
+    return out
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def wilder_rsi(_close, period, key):
+    out = rsi_wilder(_close, period)
+    out.flags.writeable = False
+    return out
+
+@st.cache_resource(max_entries=64, show_spinner=False)
+def rolling_max(_close, period, key):
+    if period > len(_close):
+        out = np.full_like(_close, np.nan)
+    else:
+        out = bn.move_max(_close, period)
+    out.flags.writeable = False
+    return out
+
+@st.cache_resource(max_entries=256, show_spinner=False)
+def signal(_arrays, _params, name, key, inputs):
+    # keyed on the strategy, the upload and only the slider values that
+    # strategy reads (StrategySpec.inputs)
+    out = STRATEGIES[name].signal(_arrays, _params)
+    out.flags.writeable = False
+    return out
+
+# ================= PIPELINE =================
+@st.cache_data(max_entries=32, show_spinner=False)
+def compute_all(_close, key, ma_short, ma_long, rsi_period, rsi_level, deviation):
+    # keyed on the upload digest and every slider value, so revisiting a
+    # parameter combination skips indicators, signals and the backtest;
+    # each entry holds N x 8 equity and positions, so only recent ones are kept
+    close = _close
+
+    # 20-bar high: the chart band, and (lagged a bar) the breakout level
+    high20 = rolling_max(close, 20, key)
+    prev_high20 = np.empty_like(high20)
+    prev_high20[0] = np.nan
+    prev_high20[1:] = high20[:-1]
+
+    arrays = Arrays(
+        close=close,
+        ma_s=sma(close, ma_short, key),
+        ma_l=sma(close, ma_long, key),
+        rsi=wilder_rsi(close, rsi_period, key),
+        prev_high20=prev_high20
+    )
+    params = Params(rsi_level=rsi_level, deviation=deviation)
+
+    sliders = {
+        "ma_short": ma_short,
+        "ma_long": ma_long,
+        "rsi_period": rsi_period,
+        "rsi_level": rsi_level,
+        "deviation": deviation
+    }
+    P = position_matrix({
+        name: signal(arrays, params, name, key, tuple(sliders[i] for i in spec.inputs))
+        for name, spec in STRATEGIES.items()
+    })
+
+    ret = np.zeros_like(close)
+    ret[1:] = close[1:] / close[:-1] - 1
+
+    EQ, total, maxdd, sharpe, trades = backtest(ret, P)
+
+    # an Arrow table goes to the browser as-is; a DataFrame would be
+    # converted to Arrow inside st.dataframe on every rerun
+    report = pa.table({
+        "Strategy": NAMES,
+        "Return%": np.round(total * 100, 2),
+        "Sharpe": np.round(sharpe, 2),
+        "MaxDD%": np.round(maxdd * 100, 2),
+        "Trades": trades
+    })
+    return arrays.ma_s, arrays.ma_l, arrays.rsi, high20, P, EQ, report
+
+uploaded_file = st.file_uploader("Upload CSV (Date + Close)", type=["csv"])
+
+if uploaded_file:
+
+    # ================= LOAD =================
+    df, date_col, price_col, key = load_clean(uploaded_file.getvalue())
+
+    if date_col is None or price_col is None:
+        st.error("CSV must contain Date and Close/Price column")
+        st.stop()
+
+    if df.empty:
+        st.error("No rows with a valid date and price were found in the CSV")
+        st.stop()
 
     if len(df) < 50:
         st.warning("Very short dataset — some strategies may not trigger.")
 
     # ================= SIDEBAR =================
-    strategy = st.sidebar.selectbox(
-        "Strategy",
-        [
-            "Buy & Hold",
-            "Momentum",
-            "Dual MA",
-            "Mean Reversion",
-            "RSI",
-            "Breakout",
-            "Trend Pullback",
-            "Blended"
-        ]
-    )
+    strategy = st.sidebar.selectbox("Strategy", NAMES)
 
     ma_short = st.sidebar.slider("Short MA", 10, 80, 50)
     ma_long = st.sidebar.slider("Long MA", 100, 250, 200)
@@ -60,66 +184,14 @@ if uploaded_file:
     deviation = st.sidebar.slider("Reversion %", 1, 10, 3)
 
     # ================= INDICATORS =================
-    df["MA_S"] = df[price_col].rolling(ma_short).mean()
-    df["MA_L"] = df[price_col].rolling(ma_long).mean()
-
-    delta = df[price_col].diff()
-    gain = delta.clip(lower=0).rolling(rsi_period).mean()
-    loss = -delta.clip(upper=0).rolling(rsi_period).mean()
-    rs = gain / loss
-    df["RSI"] = 100 - (100 / (1 + rs))
-
-    df["Return"] = df[price_col].pct_change()
-
-    # ================= STRATEGIES =================
-    def buy_hold():
-        return pd.Series(1, index=df.index)
-
-    def momentum():
-        return (df[price_col] > df["MA_S"]).astype(int)
-
-    def dual():
-        return (df["MA_S"] > df["MA_L"]).astype(int)
-
-    def reversion():
-        dev = (df[price_col] - df["MA_S"]) / df["MA_S"]
-        return (dev < -deviation/100).astype(int)
-
-    def rsi():
-        return (df["RSI"] < rsi_level).astype(int)
-
-    def breakout():
-        high = df[price_col].rolling(20).max().shift(1)
-        return (df[price_col] > high).astype(int)
-
-    def pullback():
-        up = df["MA_S"] > df["MA_L"]
-        pb = df[price_col] < df["MA_S"]
-        return (up & pb).astype(int)
-
-    def blended():
-        return (
-            momentum() +
-            dual() +
-            reversion() +
-            rsi() +
-            breakout()
-        ) / 5
-
-    strategy_map = {
-        "Buy & Hold": buy_hold(),
-        "Momentum": momentum(),
-        "Dual MA": dual(),
-        "Mean Reversion": reversion(),
-        "RSI": rsi(),
-        "Breakout": breakout(),
-        "Trend Pullback": pullback(),
-        "Blended": blended()
-    }
+    dates = df[date_col].to_numpy()
+    close = df[price_col].to_numpy()
+
+    ma_s, ma_l, rsi_vals, high20, P, EQ, report = compute_all(
+        close, key, ma_short, ma_long, rsi_period, rsi_level, deviation
+    )
 
-    df["Position"] = strategy_map[strategy]
-    df["Strat_Return"] = df["Return"] * df["Position"].shift(1)
-    df["Equity"] = (1 + df["Strat_Return"].fillna(0)).cumprod()
+    k = NAMES.index(strategy)
 
     # ================= LEARNING PANELS =================
 
@@ -297,85 +369,112 @@ if uploaded_file:
     # ================= CHART =================
     st.subheader("Chart")
 
-    entries = df[(df["Position"]>0) & (df["Position"].shift(1)==0)]
-    exits = df[(df["Position"]==0) & (df["Position"].shift(1)>0)]
+    # +1 into the market is an entry, -1 an exit
+    edges = np.diff((P[:, k] > 0).view(np.int8))
+    entries_idx = np.flatnonzero(edges == 1) + 1
+    exits_idx = np.flatnonzero(edges == -1) + 1
+
+    lines = {"Price": close}
+
+    if strategy != "RSI":
+        lines["MA_S"] = ma_s
+
+    if strategy in ["Dual MA","Trend Pullback"]:
+        lines["MA_L"] = ma_l
+
+    if strategy=="Breakout":
+        lines["20D High"] = high20
+
+    # shipped wide (dates once); the browser folds series into long form.
+    # lines are decimated to the price's LTTB points, markers stay exact
+    view = lttb(close, MAX_POINTS)
+    price_wide = pd.DataFrame({name: v[view] for name, v in lines.items()}).assign(Date=dates[view])
+
+    signals = pd.concat([
+        pd.DataFrame({"Date": dates[entries_idx], "Value": close[entries_idx], "Signal": "Entry"}),
+        pd.DataFrame({"Date": dates[exits_idx], "Value": close[exits_idx], "Signal": "Exit"})
+    ])
+
+    price_chart = alt.layer(
+        alt.Chart(price_wide).transform_fold(
+            list(lines), as_=["Series", "Value"]
+        ).mark_line().encode(
+            x="Date:T",
+            y=alt.Y("Value:Q", scale=alt.Scale(zero=False)),
+            color="Series:N"
+        ),
+        alt.Chart(signals).mark_point(filled=True, size=60).encode(
+            x="Date:T",
+            y="Value:Q",
+            shape=alt.Shape("Signal:N", scale=alt.Scale(domain=["Entry","Exit"], range=["triangle-up","triangle-down"])),
+            color=alt.Color("Signal:N", scale=alt.Scale(domain=["Entry","Exit"], range=["green","red"]))
+        )
+    ).resolve_scale(color="independent")
 
     if strategy == "RSI":
-        fig, (ax1, ax2) = plt.subplots(2,1,figsize=(10,7),sharex=True)
-
-        ax1.plot(df[date_col], df[price_col])
-        ax1.scatter(entries[date_col], entries[price_col], marker="^")
-        ax1.scatter(exits[date_col], exits[price_col], marker="v")
-
-        ax2.plot(df[date_col], df["RSI"])
-        ax2.axhline(rsi_level, linestyle="--")
-        ax2.axhline(70, linestyle="--")
-
-        st.pyplot(fig)
-
+        rsi_view = lttb(rsi_vals, MAX_POINTS)
+        rsi_chart = alt.layer(
+            alt.Chart(pd.DataFrame({"Date": dates[rsi_view], "RSI": rsi_vals[rsi_view]})).mark_line().encode(
+                x="Date:T",
+                y="RSI:Q"
+            ),
+            alt.Chart(pd.DataFrame({"Level": [rsi_level, 70]})).mark_rule(strokeDash=[4,4]).encode(
+                y="Level:Q"
+            )
+        )
+        chart = alt.vconcat(
+            price_chart.properties(height=350),
+            rsi_chart.properties(height=150)
+        ).resolve_scale(x="shared")
     else:
-        fig, ax = plt.subplots(figsize=(10,5))
-        ax.plot(df[date_col], df[price_col])
-        ax.plot(df[date_col], df["MA_S"])
-
-        if strategy in ["Dual MA","Trend Pullback"]:
-            ax.plot(df[date_col], df["MA_L"])
-
-        if strategy=="Breakout":
-            ax.plot(df[date_col], df[price_col].rolling(20).max(), linestyle="--")
+        chart = price_chart.properties(height=400)
 
-        ax.scatter(entries[date_col], entries[price_col], marker="^")
-        ax.scatter(exits[date_col], exits[price_col], marker="v")
-        st.pyplot(fig)
+    st.altair_chart(chart)
 
     # ================= METRICS =================
     st.subheader("Metrics")
 
-    if df["Equity"].notna().sum() > 0:
-        ret = (df["Equity"].iloc[-1]-1)*100
-        dd = (df["Equity"]/df["Equity"].cummax()-1).min()*100
-        sharpe = df["Strat_Return"].mean()/df["Strat_Return"].std()*np.sqrt(252) if df["Strat_Return"].std()!=0 else 0
-        trades = (df["Position"].diff()>0).sum()
-
-        c1,c2,c3,c4 = st.columns(4)
-        c1.metric("Return %", f"{ret:.2f}")
-        c2.metric("Sharpe", f"{sharpe:.2f}")
-        c3.metric("MaxDD %", f"{dd:.2f}")
-        c4.metric("Trades", int(trades))
-    else:
-        st.warning("No trades generated.")
-
-    # ================= COMPARISON =================
-    st.subheader("Strategy Comparison")
-
-    results=[]
-    for name,pos in strategy_map.items():
-        r = df["Return"]*pos.shift(1)
-        eq=(1+r.fillna(0)).cumprod()
-
-        if eq.notna().sum()==0:
-            results.append([name,0,0,0])
-            continue
-
-        ret=(eq.iloc[-1]-1)*100
-        dd=(eq/eq.cummax()-1).min()*100
-        sharpe=r.mean()/r.std()*np.sqrt(252) if r.std()!=0 else 0
-        results.append([name,round(ret,2),round(sharpe,2),round(dd,2)])
+    m = report.slice(k, 1).to_pylist()[0]
 
-    comp=pd.DataFrame(results,columns=["Strategy","Return%","Sharpe","MaxDD%"])
-    st.dataframe(comp)
+    c1,c2,c3,c4 = st.columns(4)
+    c1.metric("Return %", f"{m['Return%']:.2f}")
+    c2.metric("Sharpe", f"{m['Sharpe']:.2f}")
+    c3.metric("MaxDD %", f"{m['MaxDD%']:.2f}")
+    c4.metric("Trades", int(m["Trades"]))
 
-    # ================= EQUITY =================
-    st.subheader("Equity Curve Comparison")
-
-    fig2,ax2=plt.subplots(figsize=(10,5))
-    for name,pos in strategy_map.items():
-        r=df["Return"]*pos.shift(1)
-        eq=(1+r.fillna(0)).cumprod()
-        ax2.plot(df[date_col],eq,label=name)
-
-    ax2.legend()
-    st.pyplot(fig2)
+    # ================= COMPARISON =================
+    # all eight curves are already in EQ/report (one cached kernel pass);
+    # the table and the equity chart are only built and shipped while
+    # the expander is open, so slider tweaks skip them otherwise
+    compare = st.expander("📊 Multi-Strategy Comparison", key="compare", on_change="rerun")
+
+    if compare.open:
+        with compare:
+            st.subheader("Strategy Comparison")
+
+            st.dataframe(report, hide_index=True)
+
+            # ================= EQUITY =================
+            st.subheader("Equity Curve Comparison")
+
+            # one line mark for all eight curves; st.line_chart would melt the
+            # N x 8 frame server-side and ship the date column eight times
+            # each curve keeps its own LTTB share of the point budget; the union
+            # is shipped so every curve is drawn through its shape-defining bars
+            eq_view = np.unique(np.concatenate([
+                lttb(EQ[:, i], MAX_POINTS // len(NAMES)) for i in range(len(NAMES))
+            ]))
+            eq_wide = pd.DataFrame(EQ[eq_view], columns=NAMES).assign(Date=dates[eq_view])
+
+            st.altair_chart(
+                alt.Chart(eq_wide).transform_fold(
+                    NAMES, as_=["Strategy", "Equity"]
+                ).mark_line().encode(
+                    x="Date:T",
+                    y="Equity:Q",
+                    color=alt.Color("Strategy:N", sort=NAMES)
+                ).properties(height=400)
+            )
 
 else:
     st.info("Upload CSV to start.")
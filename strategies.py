@@ -0,0 +1,204 @@
+from typing import Callable, NamedTuple
+
+import numpy as np
+from numba import njit
+
+
+class Arrays(NamedTuple):
+    close: np.ndarray
+    ma_s: np.ndarray
+    ma_l: np.ndarray
+    rsi: np.ndarray
+    prev_high20: np.ndarray
+
+
+class Params(NamedTuple):
+    rsi_level: int
+    deviation: int
+
+
+class StrategySpec(NamedTuple):
+    signal: Callable[[Arrays, Params], np.ndarray]
+    # sliders the signal depends on, directly or through an indicator;
+    # a cached mask only needs recomputing when one of these moves
+    inputs: tuple[str, ...] = ()
+
+
+# ================= KERNELS =================
+@njit(cache=True)
+def rsi_wilder(close, n):
+    # Wilder's RSI: seed with the simple average of the first n moves,
+    # then smooth recursively (alpha = 1/n) in a single pass
+    N = close.shape[0]
+    out = np.empty_like(close)
+    out[:] = np.nan
+    if N <= n:
+        return out
+
+    avg_g = 0.0
+    avg_l = 0.0
+    for i in range(1, n + 1):
+        d = close[i] - close[i - 1]
+        avg_g += max(d, 0.0)
+        avg_l += max(-d, 0.0)
+    avg_g /= n
+    avg_l /= n
+
+    for i in range(n, N):
+        if i > n:
+            d = close[i] - close[i - 1]
+            avg_g = (avg_g * (n - 1) + max(d, 0.0)) / n
+            avg_l = (avg_l * (n - 1) + max(-d, 0.0)) / n
+        if avg_l == 0.0:
+            out[i] = 100.0
+        else:
+            out[i] = 100.0 - 100.0 / (1.0 + avg_g / avg_l)
+    return out
+
+
+@njit(cache=True)
+def backtest(ret, P):
+    # weights in P are held from the previous bar (T+1 execution).
+    # one streaming pass per strategy column: lagged-weight return,
+    # compounding, running peak/drawdown, return moments and trade starts
+    N, K = P.shape
+    EQ = np.empty((K, N))
+    total = np.empty(K)
+    maxdd = np.empty(K)
+    sharpe = np.empty(K)
+    trades = np.empty(K, np.int64)
+
+    for k in range(K):
+        eq = 1.0
+        peak = 1.0
+        dd = 0.0
+        s = 0.0
+        ss = 0.0
+        tr = 0
+        if N > 0:
+            EQ[k, 0] = 1.0
+        for i in range(1, N):
+            r = np.float64(ret[i]) * P[i - 1, k]
+            eq *= 1.0 + r
+            EQ[k, i] = eq
+            if eq > peak:
+                peak = eq
+            if eq / peak - 1.0 < dd:
+                dd = eq / peak - 1.0
+            s += r
+            ss += r * r
+            if P[i - 1, k] <= 0 and P[i, k] > 0:
+                tr += 1
+
+        # bar 0 has no prior weight, so the return stats cover N - 1 bars
+        n = N - 1
+        sd = 0.0
+        if n > 1:
+            sd = np.sqrt(max((ss - s * s / n) / (n - 1), 0.0))
+        sharpe[k] = s / n / sd * np.sqrt(252) if sd != 0 else 0.0
+        total[k] = eq - 1.0
+        maxdd[k] = dd
+        trades[k] = tr
+
+    # written strategy-major so each curve is filled contiguously
+    return EQ.T, total, maxdd, sharpe, trades
+
+
+@njit(cache=True)
+def lttb(y, n_out):
+    # Largest-Triangle-Three-Buckets: indices of n_out points that keep
+    # the visual shape of y (bars evenly spaced on x). Buckets whose
+    # triangles are NaN (indicator warm-up) fall back to their first bar
+    N = y.shape[0]
+    if n_out >= N or n_out < 3:
+        return np.arange(N)
+
+    idx = np.empty(n_out, np.int64)
+    idx[0] = 0
+    idx[n_out - 1] = N - 1
+    every = (N - 2) / (n_out - 2)
+
+    a = 0
+    for i in range(n_out - 2):
+        # average of the next bucket is the triangle's third vertex
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, N)
+        avg_x = 0.0
+        avg_y = 0.0
+        for j in range(start, end):
+            avg_x += j
+            avg_y += y[j]
+        avg_x /= end - start
+        avg_y /= end - start
+
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        best = lo
+        max_area = -1.0
+        for j in range(lo, hi):
+            area = abs((a - avg_x) * (y[j] - y[a]) - (a - j) * (avg_y - y[a]))
+            if area > max_area:
+                max_area = area
+                best = j
+        idx[i + 1] = best
+        a = best
+    return idx
+
+
+# ================= STRATEGIES =================
+def buy_hold(a: Arrays, p: Params) -> np.ndarray:
+    return np.ones(len(a.close), dtype=bool)
+
+
+def momentum(a: Arrays, p: Params) -> np.ndarray:
+    return a.close > a.ma_s
+
+
+def dual(a: Arrays, p: Params) -> np.ndarray:
+    return a.ma_s > a.ma_l
+
+
+def reversion(a: Arrays, p: Params) -> np.ndarray:
+    dev = (a.close - a.ma_s) / a.ma_s
+    return dev < -p.deviation/100
+
+
+def rsi(a: Arrays, p: Params) -> np.ndarray:
+    return a.rsi < p.rsi_level
+
+
+def breakout(a: Arrays, p: Params) -> np.ndarray:
+    return a.close > a.prev_high20
+
+
+def pullback(a: Arrays, p: Params) -> np.ndarray:
+    up = a.ma_s > a.ma_l
+    pb = a.close < a.ma_s
+    return up & pb
+
+
+STRATEGIES: dict[str, StrategySpec] = {
+    "Buy & Hold": StrategySpec(buy_hold),
+    "Momentum": StrategySpec(momentum, ("ma_short",)),
+    "Dual MA": StrategySpec(dual, ("ma_short", "ma_long")),
+    "Mean Reversion": StrategySpec(reversion, ("ma_short", "deviation")),
+    "RSI": StrategySpec(rsi, ("rsi_period", "rsi_level")),
+    "Breakout": StrategySpec(breakout),
+    "Trend Pullback": StrategySpec(pullback, ("ma_short", "ma_long")),
+}
+
+# Blended is an equal-weight vote of these signals, built from their
+# already-computed masks rather than evaluating them a second time
+BLEND = ["Momentum", "Dual MA", "Mean Reversion", "RSI", "Breakout"]
+
+NAMES = [*STRATEGIES, "Blended"]
+
+
+def position_matrix(sig: dict[str, np.ndarray]) -> np.ndarray:
+    # one mask per STRATEGIES entry in, N x len(NAMES) weight matrix out
+    sig = dict(sig)
+
+    # bool + bool is logical OR in NumPy, so count votes explicitly
+    sig["Blended"] = np.stack([sig[n] for n in BLEND]).sum(axis=0, dtype=np.float32) / len(BLEND)
+
+    return np.column_stack([sig[n] for n in NAMES]).astype(np.float32, copy=False)